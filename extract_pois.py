@@ -9,107 +9,166 @@ Example:
     python extract_pois.py 25.166974 55.259068 --radius 20 --output nearby_places.csv
 """
 
+import re
 import sys
+from functools import lru_cache
 from pathlib import Path
 
 import click
 import duckdb
-import geopandas as gpd
+import numpy as np
 import pandas as pd
-from geopy.distance import geodesic
-from shapely import wkt
-from shapely.geometry import Point
+import pyarrow as pa
+import pyarrow.csv
 
+EARTH_RADIUS_M = 6371000
 
-def categorize_place(category):
-    """Categorize places into master categories based on Overture categories."""
-    if pd.isna(category):
-        return 'other'
-    
-    category = category.lower()
-    
+
+# Master category -> Overture category keywords, in precedence order (first match wins)
+CATEGORY_KEYWORDS = [
     # Residential
-    if any(x in category for x in ['residential', 'apartment', 'housing', 'home', 'condominium', 'holiday_rental']):
-        return 'residential'
-    
+    ('residential', ['residential', 'apartment', 'housing', 'home', 'condominium', 'holiday_rental']),
     # Commercial/Office
-    elif any(x in category for x in ['office', 'business', 'commercial', 'company', 'corporate', 'professional_services', 'real_estate']):
-        return 'commercial'
-    
+    ('commercial', ['office', 'business', 'commercial', 'company', 'corporate', 'professional_services', 'real_estate']),
     # Restaurant/Food & Beverage
-    elif any(x in category for x in ['restaurant', 'cafe', 'coffee', 'food', 'dining', 'bakery', 'bar', 'pub', 'fast_food', 'eatery', 'pizza', 'burger', 'seafood', 'indian', 'chinese', 'sushi', 'steakhouse', 'buffet', 'diner', 'bistro', 'gastropub', 'ice_cream', 'dessert', 'smoothie', 'juice', 'tea']):
-        return 'restaurant'
-    
+    ('restaurant', ['restaurant', 'cafe', 'coffee', 'food', 'dining', 'bakery', 'bar', 'pub', 'fast_food', 'eatery', 'pizza', 'burger', 'seafood', 'indian', 'chinese', 'sushi', 'steakhouse', 'buffet', 'diner', 'bistro', 'gastropub', 'ice_cream', 'dessert', 'smoothie', 'juice', 'tea']),
     # Retail/Shopping
-    elif any(x in category for x in ['shop', 'store', 'retail', 'mall', 'market', 'boutique', 'supermarket', 'clothing', 'jewelry', 'furniture', 'electronics', 'mobile_phone', 'cosmetic', 'beauty_supplies', 'shoe', 'wholesale', 'department_store', 'convenience']):
-        return 'retail'
-    
+    ('retail', ['shop', 'store', 'retail', 'mall', 'market', 'boutique', 'supermarket', 'clothing', 'jewelry', 'furniture', 'electronics', 'mobile_phone', 'cosmetic', 'beauty_supplies', 'shoe', 'wholesale', 'department_store', 'convenience']),
     # Healthcare
-    elif any(x in category for x in ['hospital', 'clinic', 'medical', 'pharmacy', 'health', 'doctor', 'dentist', 'dental', 'surgeon', 'diagnostic', 'therapy', 'wellness']):
-        return 'healthcare'
-    
+    ('healthcare', ['hospital', 'clinic', 'medical', 'pharmacy', 'health', 'doctor', 'dentist', 'dental', 'surgeon', 'diagnostic', 'therapy', 'wellness']),
     # Education
-    elif any(x in category for x in ['school', 'university', 'college', 'education', 'library', 'training', 'preschool', 'tutoring', 'language_school']):
-        return 'education'
-    
+    ('education', ['school', 'university', 'college', 'education', 'library', 'training', 'preschool', 'tutoring', 'language_school']),
     # Entertainment & Recreation
-    elif any(x in category for x in ['entertainment', 'cinema', 'theater', 'museum', 'park', 'recreation', 'sport', 'gym', 'beach', 'amusement', 'club', 'dance', 'yoga', 'fitness', 'pool', 'arcade']):
-        return 'entertainment'
-    
+    ('entertainment', ['entertainment', 'cinema', 'theater', 'museum', 'park', 'recreation', 'sport', 'gym', 'beach', 'amusement', 'club', 'dance', 'yoga', 'fitness', 'pool', 'arcade']),
     # Hotel/Accommodation
-    elif any(x in category for x in ['hotel', 'accommodation', 'lodge', 'hostel', 'motel', 'resort', 'guest_house', 'bed_and_breakfast']):
-        return 'hotel'
-    
+    ('hotel', ['hotel', 'accommodation', 'lodge', 'hostel', 'motel', 'resort', 'guest_house', 'bed_and_breakfast']),
     # Transportation
-    elif any(x in category for x in ['transport', 'station', 'airport', 'parking', 'fuel', 'gas_station', 'car_rental', 'automotive', 'car_dealer', 'bus', 'metro', 'taxi']):
-        return 'transportation'
-    
+    ('transportation', ['transport', 'station', 'airport', 'parking', 'fuel', 'gas_station', 'car_rental', 'automotive', 'car_dealer', 'bus', 'metro', 'taxi']),
     # Religious
-    elif any(x in category for x in ['mosque', 'church', 'temple', 'religious', 'worship', 'cathedral']):
-        return 'religious'
-    
+    ('religious', ['mosque', 'church', 'temple', 'religious', 'worship', 'cathedral']),
     # Beauty & Personal Care
-    elif any(x in category for x in ['salon', 'spa', 'beauty', 'barber', 'massage', 'nail', 'hair', 'cosmetic']):
-        return 'beauty_personal_care'
-    
+    ('beauty_personal_care', ['salon', 'spa', 'beauty', 'barber', 'massage', 'nail', 'hair', 'cosmetic']),
     # Services
-    elif any(x in category for x in ['service', 'agency', 'travel', 'tour', 'event', 'marketing', 'advertising', 'cleaning', 'printing', 'lawyer', 'financial', 'insurance', 'banking']):
-        return 'services'
-    
+    ('services', ['service', 'agency', 'travel', 'tour', 'event', 'marketing', 'advertising', 'cleaning', 'printing', 'lawyer', 'financial', 'insurance', 'banking']),
     # Landmarks & Attractions
-    elif any(x in category for x in ['landmark', 'monument', 'historical', 'tourism', 'attraction']):
-        return 'landmark'
-    
-    else:
+    ('landmark', ['landmark', 'monument', 'historical', 'tourism', 'attraction']),
+]
+
+
+@lru_cache(maxsize=1)
+def category_patterns():
+    """
+    Compile one alternation regex per master category: a single C-level scan
+    instead of a Python-level substring test per keyword. Built lazily on
+    first use so runs that never categorize (--help, bad arguments) skip it.
+    """
+    return [
+        (master, re.compile('|'.join(map(re.escape, keywords))))
+        for master, keywords in CATEGORY_KEYWORDS
+    ]
+
+
+def categorize_place(category):
+    """Categorize places into master categories based on Overture categories."""
+    if pd.isna(category):
         return 'other'
 
+    category = category.lower()
+    for master, pattern in category_patterns():
+        if pattern.search(category):
+            return master
+    return 'other'
+
+
+def export_geoparquet(con, parquet_file):
+    """
+    Write the cache table as spatially ordered GeoParquet.
+
+    Rows are sorted along a Hilbert curve over the UAE bounding box and
+    written in small row groups, so radius queries can skip most row groups
+    via their bbox min/max statistics.
+    """
+    click.echo(f"Writing spatially ordered cache to {parquet_file}...")
+    query = f"""
+    COPY (
+        SELECT *
+        FROM uae_places
+        ORDER BY ST_Hilbert(geometry, ST_Extent(ST_MakeEnvelope(51.58, 22.50, 56.40, 26.06)))
+    ) TO '{parquet_file}' (FORMAT PARQUET, ROW_GROUP_SIZE 5000)
+    """
+    con.execute(query)
+
 
 def load_overture_data(db_path='overture_uae.duckdb', force_reload=False, s3_path=None):
     """
     Load Overture Maps data for Dubai region.
     Uses cached DuckDB file if available, otherwise downloads from S3.
-    
+
     Args:
         db_path: Path to DuckDB cache file
         force_reload: Force reload from S3 even if cache exists
         s3_path: Override S3 path (e.g., 's3://overturemaps-us-west-2/release/2025-12-17.0/theme=places/type=place/*.parquet')
     """
     db_file = Path(db_path)
+    parquet_file = db_file.with_suffix('.parquet')
+
+    # Cached runs only SELECT, so open read-only: no write-ahead log or
+    # exclusive lock, and concurrent invocations can share the cache
+    if db_file.exists() and not force_reload:
+        con = duckdb.connect(str(db_file), read_only=True)
+        has_data = con.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_name = 'uae_places'"
+        ).fetchone() is not None
+
+        if has_data:
+            con.execute("INSTALL spatial")
+            con.execute("LOAD spatial")
+
+            # Caches built before the native-GEOMETRY schema store geometry as
+            # WKT text; migrate them in place (~1s) rather than forcing a full
+            # S3 re-download with --reload
+            legacy_wkt = con.execute(
+                """
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'uae_places'
+                  AND column_name = 'geometry'
+                  AND data_type = 'VARCHAR'
+                """
+            ).fetchone() is not None
+            if legacy_wkt:
+                click.echo(f"Migrating legacy WKT cache in {db_path} to native geometry...")
+                con.close()
+                con = duckdb.connect(str(db_file))
+                con.execute("LOAD spatial")
+                con.execute(
+                    """
+                    CREATE OR REPLACE TABLE uae_places AS
+                    SELECT
+                        id,
+                        primary_name,
+                        primary_category,
+                        alternate_categories,
+                        ST_GeomFromText(geometry) AS geometry,
+                        bbox
+                    FROM uae_places
+                    """
+                )
+
+            click.echo(f"Loading cached data from {db_path}...")
+            if legacy_wkt or not parquet_file.exists():
+                export_geoparquet(con, parquet_file)
+            return con
+        con.close()
+
     con = duckdb.connect(str(db_file))
-    
-    tables = con.execute("SHOW TABLES").fetchall()
-    has_data = any('uae_places' in str(t) for t in tables)
-    
-    if has_data and not force_reload:
-        click.echo(f"Loading cached data from {db_path}...")
-        return con
+
+    con.execute("INSTALL spatial")
+    con.execute("LOAD spatial")
 
     click.echo("Downloading Overture Maps data from S3...")
     click.echo("This may take a few minutes on first run...")
 
-    con.execute("INSTALL spatial")
     con.execute("INSTALL httpfs")
-    con.execute("LOAD spatial")
     con.execute("LOAD httpfs")
     con.execute("SET s3_region='us-west-2'")
     
@@ -125,7 +184,7 @@ def load_overture_data(db_path='overture_uae.duckdb', force_reload=False, s3_pat
         names.primary AS primary_name,
         categories.primary AS primary_category,
         categories.alternate AS alternate_categories,
-        ST_AsText(geometry) as geometry,
+        geometry,
         bbox
     FROM
         read_parquet('{s3_path}', filename=true, hive_partitioning=1)
@@ -142,17 +201,33 @@ def load_overture_data(db_path='overture_uae.duckdb', force_reload=False, s3_pat
     # """
     
     con.execute(query)
-    
+
     count = con.execute("SELECT COUNT(*) FROM uae_places").fetchone()[0]
     click.echo(f"Cached {count:,} places to {db_path}")
 
+    export_geoparquet(con, parquet_file)
+
     return con
 
 
-def haversine_distance(geom, target_lat, target_lon):
-    """Calculate Haversine distance in meters between two points."""
-    point_lat, point_lon = geom.y, geom.x
-    return geodesic((point_lat, point_lon), (target_lat, target_lon)).meters
+def haversine_a(lats, lons, target_lat, target_lon):
+    """
+    Calculate the haversine 'a' term from lat/lon arrays (degrees) to a target point.
+
+    'a' is monotonic in distance (d = 2R·arcsin(√a)), so radius comparisons
+    can be done in 'a' space and the sqrt/arcsin tail deferred to the rows
+    that actually need a distance in meters.
+    """
+    # float32 is plenty here: the distances get rounded to 10 m for output and
+    # the error stays below a metre at city scale, while halving memory traffic
+    lats = np.radians(lats, dtype=np.float32)
+    lons = np.radians(lons, dtype=np.float32)
+    tlat = np.float32(np.radians(target_lat))
+    tlon = np.float32(np.radians(target_lon))
+
+    dlat = lats - tlat
+    dlon = lons - tlon
+    return np.sin(dlat / 2) ** 2 + np.cos(lats) * np.cos(tlat) * np.sin(dlon / 2) ** 2
 
 
 def extract_nearby_places(lat, lon, radius_km=20, db_path='overture_uae.duckdb', s3_path=None):
@@ -167,43 +242,83 @@ def extract_nearby_places(lat, lon, radius_km=20, db_path='overture_uae.duckdb',
         s3_path: Override S3 path for Overture Maps data
     
     Returns:
-        GeoDataFrame with nearby places and calculated distances
+        DataFrame with nearby places and calculated distances
     """
     con = load_overture_data(db_path, s3_path=s3_path)
+    parquet_file = Path(db_path).with_suffix('.parquet')
 
     click.echo(f"\nSearching for places within {radius_km}km of ({lat}, {lon})...")
 
-    uae_places = con.execute("SELECT * FROM uae_places").df()
+    # Cheap bounding-box prefilter (1 degree of latitude ~ 111.32 km), padded
+    # 1% so the exact spheroid test never loses boundary rows. Four float
+    # comparisons per row that short-circuit the geodesic math for the vast
+    # majority of POIs.
+    dlat_deg = 1.01 * radius_km / 111.32
+    dlon_deg = 1.01 * radius_km / (111.32 * np.cos(np.radians(lat)))
+
+    # Filter by radius inside DuckDB so only matching rows cross into pandas.
+    # Reading the Hilbert-ordered GeoParquet lets the bbox predicate skip most
+    # row groups from their min/max statistics. The *_Spheroid functions expect
+    # [latitude, longitude] axis order, hence the ST_FlipCoordinates on our
+    # lon/lat geometries; ::GEOMETRY strips the CRS annotation GeoParquet
+    # attaches, which otherwise blocks overload resolution.
+    query = f"""
+    SELECT
+        id,
+        primary_name,
+        primary_category,
+        CAST(alternate_categories AS VARCHAR) AS alternate_categories,
+        ST_X(geometry::GEOMETRY) AS lon,
+        ST_Y(geometry::GEOMETRY) AS lat
+    FROM read_parquet('{parquet_file}')
+    WHERE bbox.xmin BETWEEN ? AND ?
+      AND bbox.ymin BETWEEN ? AND ?
+      AND ST_DWithin_Spheroid(
+        ST_FlipCoordinates(geometry::GEOMETRY),
+        ST_Point(?, ?),
+        ?
+    )
+    """
+    # Go through Arrow: string/list columns stay in contiguous Arrow buffers
+    # instead of allocating a Python object per cell on the way into pandas
+    uae_places = con.execute(
+        query,
+        [lon - dlon_deg, lon + dlon_deg, lat - dlat_deg, lat + dlat_deg,
+         lat, lon, radius_km * 1000],
+    ).to_arrow_table().to_pandas(types_mapper=pd.ArrowDtype)
     con.close()
-    
-    print(f"Loaded {len(uae_places):,} places from cache")
-    
-    uae_places['geometry'] = uae_places['geometry'].apply(wkt.loads)
-    gdf = gpd.GeoDataFrame(uae_places, geometry='geometry', crs='EPSG:4326')
-    
-    target_point = Point(lon, lat)
+
+    print(f"Loaded {len(uae_places):,} places within radius from cache")
 
     click.echo("Calculating distances...")
 
-    gdf_metric = gdf.to_crs('EPSG:3857')
-    target_metric = gpd.GeoSeries([target_point], crs='EPSG:4326').to_crs('EPSG:3857')[0]
-    gdf_metric['euclidean_m'] = gdf_metric.geometry.distance(target_metric)
-    gdf['euclidean_m'] = gdf_metric['euclidean_m']
-    
-    gdf['haversine_m'] = gdf['geometry'].apply(
-        lambda x: haversine_distance(x, lat, lon)
-    )
-    
-    nearby = gdf[gdf['haversine_m'] <= radius_km * 1000].copy()
+    a = haversine_a(uae_places['lat'].to_numpy(), uae_places['lon'].to_numpy(), lat, lon)
+
+    # d <= radius iff a <= sin(radius/2R)^2, so filter in 'a' space first and
+    # compute every derived column below only for the surviving rows
+    within = a <= np.sin(radius_km * 1000 / (2 * EARTH_RADIUS_M)) ** 2
+    nearby = uae_places[within].copy()
+    nearby['haversine_m'] = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a[within]))
+
+    # Planar distance on a local tangent plane (equirectangular approximation);
+    # avoids reprojecting every geometry to Web Mercator, whose distances are
+    # inflated by ~10% at Dubai's latitude anyway
+    dx = np.radians(nearby['lon'].to_numpy() - lon, dtype=np.float32) * np.float32(np.cos(np.radians(lat)) * EARTH_RADIUS_M)
+    dy = np.radians(nearby['lat'].to_numpy() - lat, dtype=np.float32) * np.float32(EARTH_RADIUS_M)
+    nearby['euclidean_m'] = np.hypot(dx, dy)
+
     nearby['euclidean_km'] = (nearby['euclidean_m'] / 1000).round(2)
     nearby['haversine_km'] = (nearby['haversine_m'] / 1000).round(2)
     nearby = nearby.sort_values('haversine_m')
 
     click.echo("Categorizing places...")
-    nearby['master_category'] = nearby['primary_category'].apply(categorize_place)
-    
-    nearby['lat'] = nearby['geometry'].apply(lambda x: x.y)
-    nearby['lon'] = nearby['geometry'].apply(lambda x: x.x)
+    # Factorize categories to integer codes and classify through a lookup
+    # table: one categorize_place call per distinct category, then a single
+    # vectorized take over the codes. NaN factorizes to -1, which indexes the
+    # trailing 'other' slot.
+    codes, unique_categories = pd.factorize(nearby['primary_category'])
+    category_lut = np.array([categorize_place(c) for c in unique_categories] + ['other'])
+    nearby['master_category'] = category_lut[codes]
 
     click.echo(f"\nFound {len(nearby):,} places within {radius_km}km")
     click.echo("\n=== CATEGORY BREAKDOWN ===")
@@ -270,7 +385,9 @@ def main(latitude, longitude, radius, output, database, s3_path, reload, max_con
         ]
 
         output_df = nearby[output_columns]
-        output_df.to_csv(output, index=False)
+        # Arrow's CSV writer formats from columnar buffers in C instead of
+        # pandas' per-row Python string formatting
+        pa.csv.write_csv(pa.Table.from_pandas(output_df, preserve_index=False), output)
 
         click.echo(f"\n✓ Saved {len(output_df):,} places to {output}")
         click.echo(f"\nTop 10 nearest places:")